@@ -4,11 +4,17 @@ A Streamlit application for parsing and visualizing Abstract Syntax Trees
 """
 
 import streamlit as st
+import asyncio
+import codecs
+import hashlib
+import threading
+import time
 import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Tuple
 from parser_utils import (
-    parse_code,
-    ast_to_graphviz,
-    get_ast_summary,
+    analyze_code,
+    render_sexp,
     SUPPORTED_LANGUAGES,
     initialize_parsers
 )
@@ -21,26 +27,85 @@ except ImportError:
     GEMINI_AVAILABLE = False
 
 
-def analyze_with_llm(code: str, language: str, ast_summary: str) -> str:
+# Larger uploads are rejected rather than decoded and parsed
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _decode_upload(file_id: str, _uploaded_file) -> str:
+    """
+    Incrementally decode an uploaded file as UTF-8.
+    Keyed on Streamlit's file_id, so reruns reuse the decoded text.
     """
-    Send code and AST summary to LLM for analysis using Gemini 2.5 Flash
+    _uploaded_file.seek(0)
+    return "".join(codecs.iterdecode(_uploaded_file, "utf-8"))
+
+
+# Identical (code, language) analyses are served from memory for this long
+LLM_CACHE_TTL_SECONDS = 3600
+
+# genai.configure() swaps the module-wide client, and the async client is bound
+# to the event loop that created it, so configure + request must not interleave
+_gemini_lock = threading.Lock()
+
+
+async def _generate_content(prompt: str) -> str:
+    model = genai.GenerativeModel('gemini-2.0-flash-exp')
+    response = await model.generate_content_async(prompt)
+    return response.text
+
+
+@st.cache_resource(show_spinner=False)
+def _llm_response_cache() -> Dict[Tuple[str, str], Tuple[float, str]]:
+    """Process-wide store of successful responses: (sha256(code), language) -> (time, text)"""
+    return {}
+
+
+def _request_analysis(api_key: str, prompt: str, cache: dict, cache_key: Tuple[str, str]) -> str:
+    """
+    Run the Gemini request on the LLM worker thread.
+    Touches no Streamlit APIs; only successful responses are cached.
+    """
+    try:
+        with _gemini_lock:
+            genai.configure(api_key=api_key)
+            text = asyncio.run(_generate_content(prompt))
+        cache[cache_key] = (time.monotonic(), text)
+        return text
+    except Exception as e:
+        return f"❌ Error calling Gemini API: {str(e)}"
+
+
+def _resolved(text: str) -> Future:
+    future = Future()
+    future.set_result(text)
+    return future
+
+
+def analyze_with_llm(code: str, language: str, ast_summary: str) -> Future:
+    """
+    Send code and AST summary to LLM for analysis using Gemini 2.5 Flash.
+    Must be called from the script thread; returns a Future with the markdown response.
     """
     if not GEMINI_AVAILABLE:
-        return "Google Generative AI library not available. Install with: pip install google-generativeai"
+        return _resolved("Google Generative AI library not available. Install with: pip install google-generativeai")
     
     try:
         # Get API key from Streamlit secrets
         api_key = st.secrets.get("GEMINI_API_KEY", None)
-        if not api_key:
-            return "⚠️ Gemini API key not found. Please add GEMINI_API_KEY to your Streamlit secrets."
-        
-        # Configure Gemini API
-        genai.configure(api_key=api_key)
-        
-        # Create the model
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-        prompt = f"""You are a code analysis expert. Analyze the following {language} code and its Abstract Syntax Tree summary.
+    except Exception as e:
+        return _resolved(f"❌ Error calling Gemini API: {str(e)}")
+    if not api_key:
+        return _resolved("⚠️ Gemini API key not found. Please add GEMINI_API_KEY to your Streamlit secrets.")
+    
+    # Identical code is only sent to the API once per hour
+    cache = _llm_response_cache()
+    cache_key = (hashlib.sha256(code.encode("utf8")).hexdigest(), language)
+    cached = cache.get(cache_key)
+    if cached is not None and time.monotonic() - cached[0] < LLM_CACHE_TTL_SECONDS:
+        return _resolved(cached[1])
+    
+    prompt = f"""You are a code analysis expert. Analyze the following {language} code and its Abstract Syntax Tree summary.
 
 Code:
 ```{language.lower()}
@@ -58,12 +123,19 @@ Please provide:
 
 Keep your analysis concise and practical."""
 
-        response = model.generate_content(prompt)
-        
-        return response.text
+    if "llm_executor" not in st.session_state:
+        st.session_state["llm_executor"] = ThreadPoolExecutor(max_workers=1)
     
-    except Exception as e:
-        return f"❌ Error calling Gemini API: {str(e)}"
+    # A new analysis supersedes any request from an earlier run still waiting in the queue
+    previous = st.session_state.get("llm_future")
+    if previous is not None:
+        previous.cancel()
+    
+    future = st.session_state["llm_executor"].submit(
+        _request_analysis, api_key, prompt, cache, cache_key
+    )
+    st.session_state["llm_future"] = future
+    return future
 
 
 def main():
@@ -124,9 +196,15 @@ def main():
         )
         
         # Text area for code input
-        if uploaded_file is not None:
+        if uploaded_file is not None and uploaded_file.size > MAX_UPLOAD_BYTES:
+            st.warning(
+                f"⚠️ {uploaded_file.name} is larger than "
+                f"{MAX_UPLOAD_BYTES // (1024 * 1024)} MB and was not loaded."
+            )
+            code_input = ""
+        elif uploaded_file is not None:
             try:
-                code_input = uploaded_file.read().decode('utf-8')
+                code_input = _decode_upload(uploaded_file.file_id, uploaded_file)
                 st.success(f"✅ Loaded file: {uploaded_file.name}")
             except Exception as e:
                 st.error(f"❌ Error reading file: {str(e)}")
@@ -168,21 +246,32 @@ def main():
             st.warning("⚠️ Please enter some code to analyze.")
             return
         
+        # Encode once; the parser and the AST caches all work on UTF-8 bytes
+        code_bytes = code.encode("utf-8")
+        
         try:
             with st.spinner(f"Parsing {language} code..."):
-                # Parse the code
-                parse_result = parse_code(code, language)
+                # Parse the code (served from the AST cache when unchanged)
+                analysis = analyze_code(code_bytes, language, max_depth=max_depth)
                 
-                if not parse_result["success"]:
-                    st.error(f"❌ Parse Error: {parse_result['error']}")
+                if not analysis["success"]:
+                    st.error(f"❌ Parse Error: {analysis['error']}")
                     return
                 
-                tree = parse_result["tree"]
-                root_node = tree.root_node
-                
                 # Success message
                 st.success(f"✅ Successfully parsed {language} code!")
                 
+                # Start the LLM request now so it runs while the other tabs render
+                llm_future = None
+                if enable_llm:
+                    summary = analysis["summary"]
+                    ast_summary_text = f"""
+Total Nodes: {summary['total_nodes']}
+Tree Depth: {summary['max_depth']}
+Top-level Nodes: {', '.join([n['type'] for n in summary['top_level_nodes'][:10]])}
+"""
+                    llm_future = analyze_with_llm(code, language, ast_summary_text)
+                
                 # Create tabs for different views
                 tab1, tab2, tab3 = st.tabs(["📊 AST Visualization", "📋 AST Summary", "🤖 LLM Analysis"])
                 
@@ -191,19 +280,19 @@ def main():
                     
                     # Generate and display Graphviz chart
                     with st.spinner("Generating AST visualization..."):
-                        dot_graph = ast_to_graphviz(root_node, max_depth=max_depth)
+                        dot_graph = analysis["dot_graph"]
                         st.graphviz_chart(dot_graph, use_container_width=True)
                     
                     # Optional text representation
                     if show_ast_text:
                         with st.expander("📄 View AST as Text"):
-                            st.text(root_node.sexp())
+                            st.text(render_sexp(code_bytes, language)["sexp"])
                 
                 with tab2:
                     st.subheader("AST Summary")
                     
                     # Get summary information
-                    summary = get_ast_summary(root_node)
+                    summary = analysis["summary"]
                     
                     col_a, col_b, col_c = st.columns(3)
                     with col_a:
@@ -211,7 +300,7 @@ def main():
                     with col_b:
                         st.metric("Tree Depth", summary["max_depth"])
                     with col_c:
-                        st.metric("Top-level Nodes", len(summary["top_level_nodes"]))
+                        st.metric("Top-level Nodes", summary["top_level_count"])
                     
                     st.markdown("#### Top-Level AST Nodes")
                     if summary["top_level_nodes"]:
@@ -220,6 +309,11 @@ def main():
                             "Start Position": [f"{node['start'][0]}:{node['start'][1]}" for node in summary["top_level_nodes"]],
                             "End Position": [f"{node['end'][0]}:{node['end'][1]}" for node in summary["top_level_nodes"]]
                         })
+                        if summary["top_level_count"] > len(summary["top_level_nodes"]):
+                            st.caption(
+                                f"Showing the first {len(summary['top_level_nodes'])} "
+                                f"of {summary['top_level_count']} top-level nodes."
+                            )
                     else:
                         st.info("No top-level nodes found.")
                     
@@ -236,16 +330,11 @@ def main():
                 with tab3:
                     st.subheader("AI-Powered Code Analysis")
                     
-                    if not enable_llm:
+                    if llm_future is None:
                         st.info("🤖 Enable LLM Analysis in the sidebar to use this feature.")
                     else:
                         with st.spinner("Analyzing code with AI..."):
-                            ast_summary_text = f"""
-Total Nodes: {summary['total_nodes']}
-Tree Depth: {summary['max_depth']}
-Top-level Nodes: {', '.join([n['type'] for n in summary['top_level_nodes'][:10]])}
-"""
-                            llm_response = analyze_with_llm(code, language, ast_summary_text)
+                            llm_response = llm_future.result()
                             st.markdown(llm_response)
         
         except Exception as e:
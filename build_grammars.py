@@ -6,6 +6,8 @@ This version uses the new tree-sitter API
 import os
 import sys
 import subprocess
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import shutil
 
@@ -33,6 +35,30 @@ def run_command(cmd, cwd=None):
         return True, result.stdout
     except subprocess.CalledProcessError as e:
         return False, e.stderr
+    except OSError as e:
+        # e.g. the executable is not installed
+        return False, str(e)
+
+
+def find_pip_grammar(lang_name):
+    """Return the install directory of the tree_sitter_<lang> pip package, or None"""
+    spec = importlib.util.find_spec(f"tree_sitter_{lang_name}")
+    if spec is None or spec.origin is None:
+        return None
+    return Path(spec.origin).parent
+
+
+def clone_grammar(lang_name, repo_url, repo_dir):
+    """Clone a single grammar repository; returns (lang_name, success, message)"""
+    if repo_dir.exists():
+        return lang_name, True, "Repository already exists"
+    
+    success, output = run_command(
+        ["git", "clone", "--depth", "1", repo_url, str(repo_dir)]
+    )
+    if success:
+        return lang_name, True, "Clone successful"
+    return lang_name, False, f"Clone failed - {output}"
 
 
 def build_language_library(lang_name, repo_path, output_dir):
@@ -101,23 +127,46 @@ def main():
     grammars_dir = Path("grammars")
     grammars_dir.mkdir(exist_ok=True)
     
-    # Clone or update grammar repositories
-    print("\n📦 Downloading grammar repositories...")
-    for lang_name, repo_url in GRAMMARS.items():
-        repo_dir = grammars_dir / f"tree-sitter-{lang_name}"
+    # Grammars installed from pip already ship compiled parsers
+    print("\n🔎 Checking for pip-installed grammars...")
+    pip_grammars = {}
+    for lang_name in GRAMMARS:
+        package_dir = find_pip_grammar(lang_name)
+        if package_dir is not None:
+            pip_grammars[lang_name] = package_dir
+            print(f"  ✓ {lang_name}: Found tree_sitter_{lang_name} at {package_dir}")
+    
+    missing = {name: url for name, url in GRAMMARS.items() if name not in pip_grammars}
+    
+    # Clone grammar repositories concurrently; each clone is network-bound
+    if missing:
+        # git is only needed when some grammar has to be cloned
+        success, _ = run_command(["git", "--version"])
+        if not success:
+            print("❌ Error: git is not installed or not in PATH")
+            print(f"Please install git, or pip install the missing grammars: {', '.join(missing)}")
+            return False
         
-        if repo_dir.exists():
-            print(f"  ✓ {lang_name}: Repository already exists")
-        else:
+        print("\n📦 Downloading grammar repositories...")
+        for lang_name, repo_url in missing.items():
             print(f"  ⬇️  {lang_name}: Cloning from {repo_url}")
-            success, output = run_command(
-                ["git", "clone", "--depth", "1", repo_url, str(repo_dir)]
-            )
+        
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            futures = [
+                executor.submit(clone_grammar, lang_name, repo_url, grammars_dir / f"tree-sitter-{lang_name}")
+                for lang_name, repo_url in missing.items()
+            ]
+            results = [future.result() for future in futures]
+        
+        failed = False
+        for lang_name, success, message in results:
             if success:
-                print(f"  ✓ {lang_name}: Clone successful")
+                print(f"  ✓ {lang_name}: {message}")
             else:
-                print(f"  ✗ {lang_name}: Clone failed - {output}")
-                return False
+                print(f"  ✗ {lang_name}: {message}")
+                failed = True
+        if failed:
+            return False
     
     # With tree-sitter 0.25+, we use a different approach
     print("\n🔧 Setting up language parsers...")
@@ -126,6 +175,9 @@ def main():
     # Create a manifest file that tells parser_utils where to find grammars
     manifest = {}
     for lang_name in GRAMMARS.keys():
+        if lang_name in pip_grammars:
+            manifest[lang_name] = str(pip_grammars[lang_name].absolute())
+            continue
         repo_dir = grammars_dir / f"tree-sitter-{lang_name}"
         src_dir = repo_dir / "src"
         if not src_dir.exists():
@@ -149,13 +201,6 @@ if __name__ == "__main__":
     print("Tree-sitter Grammar Setup (v0.25+ Compatible)")
     print("=" * 50)
     
-    # Check if git is available
-    success, _ = run_command(["git", "--version"])
-    if not success:
-        print("❌ Error: git is not installed or not in PATH")
-        print("Please install git to continue.")
-        sys.exit(1)
-    
     # Run the build process
     if main():
         print("\n✅ Setup completed successfully!")
@@ -4,31 +4,49 @@ Updated for Tree-sitter v0.22+ (Pip Package Based)
 """
 
 import streamlit as st
-from collections import Counter
-from typing import Dict, Any, Optional
+import hashlib
+import importlib
+import importlib.metadata
+import json
+import sqlite3
+import threading
+from functools import partial
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple, Union
 
-# Global cache
-_parsers: Dict[str, Any] = {}
-LANGUAGE_MODULES = {}
+# On-disk cache of parse artifacts, keyed by (language + grammar version, sha256(source))
+AST_CACHE_PATH = Path.home() / ".cache" / "llm_symexec" / "ast.db"
+
+_ast_cache_lock = threading.Lock()
+
+# Bump when the layout of cached artifacts changes; older caches are dropped
+AST_CACHE_SCHEMA = 2
+
+# The text view of the AST is cut off past this many characters
+SEXP_MAX_CHARS = 200_000
+
+# Only the first top-level nodes are kept in the summary (the rest are counted)
+MAX_TOP_LEVEL = 50
+
+LANGUAGE_PACKAGES = {
+    "Python": "tree_sitter_python",
+    "JavaScript": "tree_sitter_javascript",
+    "Java": "tree_sitter_java",
+    "C": "tree_sitter_c",
+    "C++": "tree_sitter_cpp"
+}
+
+# Grammar packages are compiled extensions, so they are only imported the
+# first time their language is actually parsed
+LANGUAGE_LOADERS = {
+    name: partial(importlib.import_module, package)
+    for name, package in LANGUAGE_PACKAGES.items()
+}
 
 try:
     from tree_sitter import Language, Parser, Node
-    import tree_sitter_python
-    import tree_sitter_javascript
-    import tree_sitter_java
-    import tree_sitter_c
-    import tree_sitter_cpp
     
     TREE_SITTER_AVAILABLE = True
-    
-    # Define available modules
-    LANGUAGE_MODULES = {
-        "Python": tree_sitter_python,
-        "JavaScript": tree_sitter_javascript,
-        "Java": tree_sitter_java,
-        "C": tree_sitter_c,
-        "C++": tree_sitter_cpp
-    }
 except ImportError as e:
     TREE_SITTER_AVAILABLE = False
     Language = None
@@ -37,11 +55,12 @@ except ImportError as e:
     IMPORT_ERROR = str(e)
 
 # FIX: Ensure this is a dictionary so app.py can call .keys() on it
-SUPPORTED_LANGUAGES = LANGUAGE_MODULES if TREE_SITTER_AVAILABLE else {}
+SUPPORTED_LANGUAGES = LANGUAGE_LOADERS if TREE_SITTER_AVAILABLE else {}
 
 def initialize_parsers() -> Dict[str, Any]:
     """
-    Initialize Tree-sitter parsers using installed pip packages.
+    Check that the Tree-sitter runtime is installed.
+    Individual language parsers are loaded lazily by parse_code.
     """
     if not TREE_SITTER_AVAILABLE:
         return {
@@ -49,118 +68,296 @@ def initialize_parsers() -> Dict[str, Any]:
             "error": f"Tree-sitter packages not found. Error: {globals().get('IMPORT_ERROR', 'Unknown error')}. Please install: pip install tree-sitter tree-sitter-python tree-sitter-javascript tree-sitter-java tree-sitter-c tree-sitter-cpp"
         }
     
-    try:
-        # Pre-load parsers
-        for name, module in LANGUAGE_MODULES.items():
-            try:
-                # Valid for tree-sitter 0.22+
-                lang = Language(module.language())
-                parser = Parser(lang)
-                _parsers[name] = parser
-            except Exception as e:
-                print(f"Warning: Could not load {name}: {e}")
-        
-        return {"success": True}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    return {"success": True}
+
+@st.cache_resource(show_spinner=False)
+def _get_parser(language_display_name: str):
+    """
+    Import the grammar and build its parser on first use.
+    Parsers are C handles, so they are kept resident in Streamlit's resource cache.
+    """
+    module = LANGUAGE_LOADERS[language_display_name]()
+    # Valid for tree-sitter 0.22+
+    lang = Language(module.language())
+    return Parser(lang)
 
-def parse_code(code: str, language_display_name: str) -> Dict[str, Any]:
+def parse_code(code: Union[str, bytes], language_display_name: str) -> Dict[str, Any]:
     if not TREE_SITTER_AVAILABLE:
         return {"success": False, "error": "Tree-sitter not available."}
 
-    if language_display_name not in _parsers:
-        # Try to initialize on demand
-        if language_display_name in LANGUAGE_MODULES:
-            try:
-                module = LANGUAGE_MODULES[language_display_name]
-                lang = Language(module.language())
-                parser = Parser(lang)
-                _parsers[language_display_name] = parser
-            except Exception as e:
-                return {"success": False, "error": f"Failed to load parser: {str(e)}"}
-        else:
-            return {"success": False, "error": f"Unsupported language: {language_display_name}"}
+    if language_display_name not in LANGUAGE_LOADERS:
+        return {"success": False, "error": f"Unsupported language: {language_display_name}"}
     
-    parser = _parsers[language_display_name]
+    try:
+        parser = _get_parser(language_display_name)
+    except Exception as e:
+        return {"success": False, "error": f"Failed to load parser: {str(e)}"}
     
     try:
-        tree = parser.parse(bytes(code, "utf8"))
+        # UTF-8 bytes are parsed as-is; only text needs encoding
+        source = code if isinstance(code, bytes) else code.encode("utf8")
+        tree = parser.parse(source)
         return {"success": True, "tree": tree}
     except Exception as e:
         return {"success": False, "error": f"Parse error: {str(e)}"}
 
-def ast_to_graphviz(root_node, max_depth: int = 10) -> str:
-    dot_lines = [
-        "digraph AST {",
-        "  rankdir=TB;",
-        "  node [shape=box, style=rounded, fontname=Arial];",
-        "  edge [fontname=Arial, fontsize=10];",
-        ""
-    ]
+@st.cache_resource(show_spinner=False)
+def _open_ast_cache() -> Optional[sqlite3.Connection]:
+    """
+    Open (and create if needed) the on-disk AST cache, once per process.
+    Returns None if the cache is unavailable; callers then simply re-parse.
+    """
+    try:
+        AST_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        # Shared by every session's script thread; access goes through _ast_cache_lock
+        conn = sqlite3.connect(str(AST_CACHE_PATH), check_same_thread=False)
+        if conn.execute("PRAGMA user_version").fetchone()[0] != AST_CACHE_SCHEMA:
+            with conn:
+                for table in ("ast", "summary", "dot"):
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute(f"PRAGMA user_version = {AST_CACHE_SCHEMA}")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ast ("
+            "lang TEXT, sha256 BLOB, sexp BLOB, "
+            "PRIMARY KEY(lang, sha256))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS summary ("
+            "lang TEXT, sha256 BLOB, summary TEXT, "
+            "PRIMARY KEY(lang, sha256))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS dot ("
+            "lang TEXT, sha256 BLOB, max_depth INTEGER, dot TEXT, "
+            "PRIMARY KEY(lang, sha256, max_depth))"
+        )
+        return conn
+    except (sqlite3.Error, OSError) as e:
+        print(f"Warning: AST cache unavailable: {e}")
+        return None
+
+def _cache_fetch(query: str, params: tuple) -> Optional[tuple]:
+    conn = _open_ast_cache()
+    if conn is None:
+        return None
+    with _ast_cache_lock:
+        try:
+            return conn.execute(query, params).fetchone()
+        except sqlite3.Error as e:
+            print(f"Warning: AST cache lookup failed: {e}")
+            return None
+
+def _cache_store(query: str, params: tuple) -> None:
+    conn = _open_ast_cache()
+    if conn is None:
+        return
+    with _ast_cache_lock:
+        try:
+            with conn:
+                conn.execute(query, params)
+        except sqlite3.Error as e:
+            print(f"Warning: AST cache write failed: {e}")
+
+@st.cache_resource(show_spinner=False)
+def _grammar_id(language_display_name: str) -> str:
+    """
+    Identify the installed grammar and runtime without importing them.
+    Part of the AST cache key, so upgrading either invalidates cached artifacts.
+    """
+    versions = []
+    for package in (LANGUAGE_PACKAGES.get(language_display_name), "tree_sitter"):
+        try:
+            versions.append(f"{package}=={importlib.metadata.version(package)}")
+        except (importlib.metadata.PackageNotFoundError, ValueError):
+            versions.append(f"{package}==unknown")
+    return ";".join(versions)
+
+def _cache_key(code: Union[str, bytes], language_display_name: str) -> tuple:
+    source = code if isinstance(code, bytes) else code.encode("utf8")
+    lang = f"{language_display_name}@{_grammar_id(language_display_name)}"
+    return (lang, hashlib.sha256(source).digest())
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def analyze_code(code: Union[str, bytes], language_display_name: str, max_depth: int = 10) -> Dict[str, Any]:
+    """
+    Build the Graphviz DOT graph and the AST summary for the code.
+    Memoized across Streamlit reruns and cached on disk by content hash.
+    """
+    key = _cache_key(code, language_display_name)
+    summary_row = _cache_fetch("SELECT summary FROM summary WHERE lang=? AND sha256=?", key)
+    dot_row = _cache_fetch(
+        "SELECT dot FROM dot WHERE lang=? AND sha256=? AND max_depth=?", key + (max_depth,)
+    )
+    if summary_row is not None and dot_row is not None:
+        return {"success": True, "dot_graph": dot_row[0], "summary": json.loads(summary_row[0])}
     
-    node_counter = [0]
+    parse_result = parse_code(code, language_display_name)
+    if not parse_result["success"]:
+        return parse_result
     
-    def add_node(node, parent_id: Optional[int] = None, depth: int = 0) -> int:
-        if depth > max_depth:
-            return -1
-        
-        current_id = node_counter[0]
-        node_counter[0] += 1
-        
-        node_type = node.type.replace('"', '\\"')
-        
-        if node.is_named:
-            color = "#E3F2FD"
-            border_color = "#1976D2"
-        else:
-            color = "#F5F5F5"
-            border_color = "#757575"
-        
-        dot_lines.append(
-            f'  node{current_id} [label="{node_type}", '
-            f'fillcolor="{color}", color="{border_color}", style="rounded,filled"];'
+    root_node = parse_result["tree"].root_node
+    if summary_row is not None:
+        # Only the depth changed; the depth-bounded walk is enough
+        dot_graph = ast_to_graphviz(root_node, max_depth=max_depth)
+        summary = json.loads(summary_row[0])
+    else:
+        dot_graph, summary = analyze_ast(root_node, max_depth=max_depth)
+        _cache_store(
+            "INSERT OR REPLACE INTO summary (lang, sha256, summary) VALUES (?, ?, ?)",
+            key + (json.dumps(summary),)
         )
+    _cache_store("INSERT OR REPLACE INTO dot VALUES (?, ?, ?, ?)", key + (max_depth, dot_graph))
+    return {"success": True, "dot_graph": dot_graph, "summary": summary}
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def render_sexp(code: Union[str, bytes], language_display_name: str) -> Dict[str, Any]:
+    """
+    Build the s-expression for the code, cut off after SEXP_MAX_CHARS.
+    Only called when the user asks for the text view.
+    """
+    key = _cache_key(code, language_display_name)
+    row = _cache_fetch("SELECT sexp FROM ast WHERE lang=? AND sha256=?", key)
+    if row is not None:
+        sexp = row[0].decode("utf8")
+    else:
+        parse_result = parse_code(code, language_display_name)
+        if not parse_result["success"]:
+            return parse_result
         
-        if parent_id is not None:
-            dot_lines.append(f'  node{parent_id} -> node{current_id};')
-        
-        for child in node.children:
-            add_node(child, current_id, depth + 1)
+        sexp = str(parse_result["tree"].root_node)[:SEXP_MAX_CHARS + 1]
+        _cache_store(
+            "INSERT OR REPLACE INTO ast (lang, sha256, sexp) VALUES (?, ?, ?)",
+            key + (sexp.encode("utf8"),)
+        )
+    
+    if len(sexp) > SEXP_MAX_CHARS:
+        sexp = sexp[:SEXP_MAX_CHARS] + "\n…[truncated]"
+    return {"success": True, "sexp": sexp}
+
+DOT_HEADER = (
+    "digraph AST {\n"
+    "  rankdir=TB;\n"
+    "  node [shape=box, style=rounded, fontname=Arial];\n"
+    "  edge [fontname=Arial, fontsize=10];\n"
+)
+# Named nodes are blue, anonymous (punctuation/keyword) nodes are grey
+NAMED_TPL = '  node%d [label="%s", fillcolor="#E3F2FD", color="#1976D2", style="rounded,filled"];'
+ANON_TPL = '  node%d [label="%s", fillcolor="#F5F5F5", color="#757575", style="rounded,filled"];'
+EDGE_TPL = '  node%d -> node%d;'
+
+def _emit_dot_node(node, depth: int, node_lines: list, edge_lines: list,
+                   parent_ids: list, labels: Dict[int, str]) -> None:
+    """
+    Append the DOT declaration for node, and the edge from its parent.
+    Shared by ast_to_graphviz and analyze_ast, which must render identically.
+    """
+    current_id = len(node_lines)
+    
+    # type and is_named are fixed per grammar symbol, so each label is built once
+    kind_id = node.kind_id
+    label = labels.get(kind_id)
+    if label is None:
+        node_type = node.type.replace('"', '\\"').replace("%", "%%")
+        label = (NAMED_TPL if node.is_named else ANON_TPL).replace("%s", node_type, 1)
+        labels[kind_id] = label
+    node_lines.append(label % current_id)
+    
+    if depth > 0:
+        edge_lines.append(EDGE_TPL % (parent_ids[depth - 1], current_id))
+    
+    # parent_ids[d] is the DOT id of the most recent node emitted at depth d
+    del parent_ids[depth:]
+    parent_ids.append(current_id)
+
+def _join_dot(node_lines: list, edge_lines: list) -> str:
+    return "\n".join((DOT_HEADER, "\n".join(node_lines), "\n".join(edge_lines), "}"))
+
+def ast_to_graphviz(root_node, max_depth: int = 10) -> str:
+    """
+    Build the DOT graph alone, never descending below max_depth.
+    Used when only the depth changed and the summary is already cached.
+    """
+    node_lines = []
+    edge_lines = []
+    parent_ids = []
+    labels: Dict[int, str] = {}
+    
+    cursor = root_node.walk()
+    depth = 0
+    reached_end = max_depth < 0
+    while not reached_end:
+        _emit_dot_node(cursor.node, depth, node_lines, edge_lines, parent_ids, labels)
         
-        return current_id
+        # Subtrees below max_depth are never entered
+        if depth < max_depth and cursor.goto_first_child():
+            depth += 1
+            continue
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                reached_end = True
+                break
+            depth -= 1
     
-    add_node(root_node)
-    dot_lines.append("}")
-    return "\n".join(dot_lines)
-
-def get_ast_summary(root_node) -> Dict[str, Any]:
-    node_types = Counter()
-    total_nodes = [0]
-    max_depth = [0]
+    return _join_dot(node_lines, edge_lines)
+
+def analyze_ast(root_node, max_depth: int = 10) -> Tuple[str, Dict[str, Any]]:
+    """
+    Build the DOT graph and the AST summary in a single cursor walk.
+    The summary covers the whole tree; the graph stops at max_depth.
+    """
+    node_lines = []
+    edge_lines = []
+    parent_ids = []
+    labels: Dict[int, str] = {}
+    
+    node_types: Dict[str, int] = {}
+    total_nodes = 0
+    tree_depth = 0
     top_level_nodes = []
+    top_level_count = 0
     
-    def traverse(node, depth: int = 0):
-        total_nodes[0] += 1
-        max_depth[0] = max(max_depth[0], depth)
+    cursor = root_node.walk()
+    depth = 0
+    reached_end = False
+    while not reached_end:
+        node = cursor.node
+        total_nodes += 1
+        if depth > tree_depth:
+            tree_depth = depth
         
-        if node.is_named:
-            node_types[node.type] += 1
+        is_named = node.is_named
+        if is_named:
+            node_type = node.type
+            node_types[node_type] = node_types.get(node_type, 0) + 1
         
-        if depth == 1 and node.is_named:
-            top_level_nodes.append({
-                "type": node.type,
-                "start": (node.start_point.row + 1, node.start_point.column),
-                "end": (node.end_point.row + 1, node.end_point.column)
-            })
+        if depth == 1 and is_named:
+            top_level_count += 1
+            if top_level_count <= MAX_TOP_LEVEL:
+                start_point = node.start_point
+                end_point = node.end_point
+                top_level_nodes.append({
+                    "type": node.type,
+                    "start": (start_point.row + 1, start_point.column),
+                    "end": (end_point.row + 1, end_point.column)
+                })
         
-        for child in node.children:
-            traverse(child, depth + 1)
-    
-    traverse(root_node)
+        if depth <= max_depth:
+            _emit_dot_node(node, depth, node_lines, edge_lines, parent_ids, labels)
+        
+        if cursor.goto_first_child():
+            depth += 1
+            continue
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                reached_end = True
+                break
+            depth -= 1
     
-    return {
-        "total_nodes": total_nodes[0],
-        "max_depth": max_depth[0],
-        "node_types": dict(node_types),
-        "top_level_nodes": top_level_nodes
-    }
\ No newline at end of file
+    summary = {
+        "total_nodes": total_nodes,
+        "max_depth": tree_depth,
+        "node_types": node_types,
+        "top_level_nodes": top_level_nodes,
+        "top_level_count": top_level_count
+    }
+    return _join_dot(node_lines, edge_lines), summary